@@ -47,7 +47,7 @@ class Aggregation(nn.Module):
         x_rot = self.rot_drop(x_rot)  
         x_rot = self.rot_pool(x_rot)  # (19.6)
         x_rot = self.fc2(x_rot.view(x_rot.shape[0],-1))
-        return x_rot, x_tr
+        return torch.cat((x_rot,x_tr),dim=1)  # twist (B,6): [rot, tsl]
 
 class CalibNet(nn.Module):
     def __init__(self,backbone_pretrained=False,depth_scale=100.0):
@@ -71,14 +71,13 @@ class CalibNet(nn.Module):
         x1 = self.rgb_resnet(x1)[-1]
         x2 = self.depth_resnet(x2)[-1]
         feat = torch.cat((x1,x2),dim=1)  # [B,C1+C2,H,W]
-        x_rot, x_tr =  self.aggregation(feat)
-        return x_rot, x_tr
+        twist = self.aggregation(feat)  # [B,6]
+        return twist
 if __name__=="__main__":
     x = (torch.rand(2,3,1242,375).cuda(),torch.rand(2,1,1242,375).cuda())
     model = CalibNet(backbone_pretrained=False).cuda()
     model.eval()
-    rotation,translation = model(*x)
-    print("translation size:{}".format(translation.size()))
-    print("rotation size:{}".format(rotation.size()))
+    twist = model(*x)
+    print("twist size:{}".format(twist.size()))
 
 
@@ -101,7 +101,7 @@ class BaseKITTIDataset(Dataset):
     def __init__(self,basedir:str,batch_size:int,seqs=['09','10'],cam_id:int=2,
                  meta_json='data_len.json',skip_frame=1,
                  voxel_size=0.3,pcd_sample_num=4096,resize_ratio=(0.5,0.5),extend_ratio=(2.5,2.5),
-                 ):
+                 cache_dir=None):
         if not os.path.exists(os.path.join(basedir,meta_json)):
             check_length(basedir,meta_json)
         with open(os.path.join(basedir,meta_json),'r')as f:
@@ -114,6 +114,8 @@ class BaseKITTIDataset(Dataset):
                 frame = frame[:-cut_index]
             frame_list.append(frame)
         self.kitti_datalist = [pykitti.odometry(basedir,seq,frames=frame) for seq,frame in zip(seqs,frame_list)]  
+        self.seqs = seqs
+        self.frame_list = frame_list
         # concat images from different seq into one batch will cause error
         self.cam_id = cam_id
         self.resize_ratio = resize_ratio
@@ -126,6 +128,12 @@ class BaseKITTIDataset(Dataset):
         self.img_tran = Tf.ToTensor()
         self.pcd_tran = KITTIFilter(voxel_size,'none')
         self.extend_ratio = extend_ratio
+        if cache_dir:
+            # voxelized pcd (before random resampling) is cached as .npy files, it only depends on these settings
+            self.cache_dir = os.path.join(cache_dir,'cam{}_voxel{}_resize{}x{}_extend{}x{}'.format(
+                cam_id,voxel_size,*resize_ratio,*extend_ratio))
+        else:
+            self.cache_dir = None
         
     def __len__(self):
         return self.sumsep[-1]
@@ -140,6 +148,30 @@ class BaseKITTIDataset(Dataset):
         assert hasattr(calib,'T_cam0_velo'), head_msg+"Crucial calib attribute 'T_cam0_velo' doesn't exist!"
         
     
+    def get_calibed_pcd(self,group_id:int,sub_index:int,T_cam2velo:np.ndarray,K_cam_extend:np.ndarray,rev_shape:tuple)->np.ndarray:
+        """voxelized pcd in camera frame inside the extended image (loaded from cache_dir if available)
+
+        Returns:
+            np.ndarray: (3,N)
+        """
+        if self.cache_dir is not None:
+            cache_file = os.path.join(self.cache_dir,self.seqs[group_id],'%06d.npy'%self.frame_list[group_id][sub_index])
+            if os.path.isfile(cache_file):
+                return np.load(cache_file)
+        pcd = self.kitti_datalist[group_id].get_velo(sub_index)
+        pcd[:,3] = 1.0  # (N,4)
+        calibed_pcd = T_cam2velo @ pcd.T  # [4,4] @ [4,N] -> [4,N]
+        _calibed_pcd = self.pcd_tran(calibed_pcd[:3,:].T).T  # raw pcd input (3,N)
+        *_,rev = transform.binary_projection(rev_shape,K_cam_extend,_calibed_pcd)
+        _calibed_pcd = _calibed_pcd[:,rev]
+        if self.cache_dir is not None:
+            os.makedirs(os.path.dirname(cache_file),exist_ok=True)
+            tmp_file = '{}.{}.tmp'.format(cache_file,os.getpid())  # dataloader workers may write concurrently
+            with open(tmp_file,'wb')as f:
+                np.save(f,_calibed_pcd)
+            os.replace(tmp_file,cache_file)
+        return _calibed_pcd
+
     def __getitem__(self, index):
         group_id = np.digitize(index,self.sumsep,right=False)
         data = self.kitti_datalist[group_id]
@@ -159,12 +191,7 @@ class BaseKITTIDataset(Dataset):
         K_cam_extend[1,-1] *= self.extend_ratio[1]
         raw_img = raw_img.resize([RW,RH],Image.BILINEAR)
         _img = self.img_tran(raw_img)  # raw img input (3,H,W)
-        pcd = data.get_velo(sub_index)
-        pcd[:,3] = 1.0  # (N,4)
-        calibed_pcd = T_cam2velo @ pcd.T  # [4,4] @ [4,N] -> [4,N]
-        _calibed_pcd = self.pcd_tran(calibed_pcd[:3,:].T).T  # raw pcd input (3,N)
-        *_,rev = transform.binary_projection((REVH,REVW),K_cam_extend,_calibed_pcd)
-        _calibed_pcd = _calibed_pcd[:,rev]  
+        _calibed_pcd = self.get_calibed_pcd(group_id,sub_index,T_cam2velo,K_cam_extend,(REVH,REVW))  # (3,N)
         _calibed_pcd = self.resample_tran(_calibed_pcd.T).T # (3,n)
         _pcd_range = np.linalg.norm(_calibed_pcd,axis=0)  # (n,)
         u,v,r,_ = transform.pcd_projection((RH,RW),K_cam,_calibed_pcd,_pcd_range)
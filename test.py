@@ -16,6 +16,7 @@ def options():
     parser.add_argument("--config",type=str,default='config.yml')
     parser.add_argument("--dataset_path",type=str,default='data/')
     parser.add_argument("--skip_frame",type=int,default=1,help='skip frame of dataset')
+    parser.add_argument("--pcd_cache_dir",type=str,default='',help='cache voxelized pcd as .npy files in this dir (empty: no cache)')
     parser.add_argument("--pcd_sample",type=int,default=-1) # -1 means total sample
     parser.add_argument("--max_deg",type=float,default=10)  # 10deg in each axis  (see the paper)
     parser.add_argument("--max_tran",type=float,default=0.2)   # 0.2m in each axis  (see the paper)
@@ -46,23 +47,27 @@ def test(args,chkpt:dict,test_loader):
     logger = get_logger('{name}-Test'.format(name=args.name),os.path.join(args.log_dir,args.name+'_test.log'),mode='w')
     logger.debug(args)
     res_npy = np.zeros([len(test_loader),6])
+    depth_generators = dict()  # DepthImgGenerator cached by (img_shape, InTran)
     for i,batch in enumerate(test_loader):
-        rgb_img = batch['img'].to(device)
+        rgb_img = batch['img'].to(device,non_blocking=True)
         B = rgb_img.size(0)
-        pcd_range = batch['pcd_range'].to(device)
-        uncalibed_pcd = batch['uncalibed_pcd'].to(device)
-        uncalibed_depth_img = batch['uncalibed_depth_img'].to(device)
-        InTran = batch['InTran'][0].to(device)
-        igt = batch['igt'].to(device)
+        pcd_range = batch['pcd_range'].to(device,non_blocking=True)
+        uncalibed_pcd = batch['uncalibed_pcd'].to(device,non_blocking=True)
+        uncalibed_depth_img = batch['uncalibed_depth_img'].to(device,non_blocking=True)
+        InTran = batch['InTran'][0]
+        igt = batch['igt'].to(device,non_blocking=True)
         img_shape = rgb_img.shape[-2:]
-        depth_generator = utils.transform.DepthImgGenerator(img_shape,InTran,pcd_range,CONFIG['dataset']['pooling'])
+        gen_key = (tuple(img_shape),tuple(InTran.view(-1).tolist()))  # intrinsics differ among KITTI sequences
+        if gen_key not in depth_generators:
+            depth_generators[gen_key] = utils.transform.DepthImgGenerator(img_shape,InTran,CONFIG['dataset']['pooling'])
+        depth_generator = depth_generators[gen_key]
         # model(rgb_img,uncalibed_depth_img)
-        Tcl = torch.eye(4).repeat(B,1,1).to(device)
+        Tcl = torch.eye(4,device=device).unsqueeze(0).expand(B,-1,-1).contiguous()
         for _ in range(args.inner_iter):
-            twist_rot, twist_tsl = model(rgb_img,uncalibed_depth_img)
-            iter_Tcl = utils.se3.exp(torch.cat([twist_rot,twist_tsl],dim=1))
-            uncalibed_depth_img, uncalibed_pcd = depth_generator(iter_Tcl,uncalibed_pcd)
-            Tcl = Tcl.bmm(iter_Tcl)
+            twist = model(rgb_img,uncalibed_depth_img)
+            iter_Tcl = utils.se3.exp(twist)
+            uncalibed_depth_img, uncalibed_pcd = depth_generator(iter_Tcl,uncalibed_pcd,pcd_range)
+            Tcl = iter_Tcl.bmm(Tcl)  # left product: pcd is transformed by iter_Tcl after Tcl
         dg = Tcl.bmm(igt)
         rot_dx,tsl_dx = loss_utils.gt2euler(dg.squeeze(0).cpu().detach().numpy())
         rot_dx = rot_dx.reshape(-1)
@@ -95,7 +100,7 @@ if __name__ == "__main__":
     test_dataset = BaseKITTIDataset(args.dataset_path,args.batch_size,test_split,CONFIG['dataset']['cam_id'],
                                      skip_frame=args.skip_frame,voxel_size=CONFIG['dataset']['voxel_size'],
                                      pcd_sample_num=args.pcd_sample,resize_ratio=args.resize_ratio,
-                                     extend_ratio=CONFIG['dataset']['extend_ratio'])
+                                     extend_ratio=CONFIG['dataset']['extend_ratio'],cache_dir=args.pcd_cache_dir)
     os.makedirs(args.res_dir,exist_ok=True)
     test_perturb_file = os.path.join(args.checkpoint_dir,"test_seq.csv")
     test_length = len(test_dataset)
@@ -118,5 +123,6 @@ if __name__ == "__main__":
             print_highlight('Validation perturb file rewritten.')
     test_dataset = KITTI_perturb(test_dataset,args.max_deg,args.max_tran,args.mag_randomly,
                                 pooling_size=CONFIG['dataset']['pooling'],file=test_perturb_file)
-    test_dataloader = DataLoader(test_dataset,args.batch_size,num_workers=args.num_workers,pin_memory=args.pin_memory)
+    use_pin = args.pin_memory and torch.cuda.is_available()  # page-locked memory is useless without CUDA
+    test_dataloader = DataLoader(test_dataset,args.batch_size,num_workers=args.num_workers,pin_memory=use_pin)
     test(args,chkpt,test_dataloader)
\ No newline at end of file
@@ -1,4 +1,6 @@
 import argparse
+import inspect
+import threading
 from asyncio.log import logger
 import os
 import yaml
@@ -21,13 +23,15 @@ def options():
     parser.add_argument("--config",type=str,default='config.yml')
     parser.add_argument("--dataset_path",type=str,default='data/')
     parser.add_argument("--skip_frame",type=int,default=5,help='skip frame of dataset')
+    parser.add_argument("--pcd_cache_dir",type=str,default='',help='cache voxelized pcd as .npy files in this dir (empty: no cache)')
     parser.add_argument("--pcd_sample",type=int,default=20000)
     parser.add_argument("--max_deg",type=float,default=10)  # 10deg in each axis  (see the paper)
     parser.add_argument("--max_tran",type=float,default=0.2)   # 0.2m in each axis  (see the paper)
     parser.add_argument("--mag_randomly",type=bool,default=True)
     # dataloader
     parser.add_argument("--batch_size",type=int,default=8)
-    parser.add_argument("--num_workers",type=int,default=12)
+    parser.add_argument("--num_workers",type=int,default=4)
+    parser.add_argument("--prefetch_factor",type=int,default=2,help='batches prefetched by each worker, reduce it if pinned memory keeps growing')
     parser.add_argument("--pin_memory",type=bool,default=True,help='set it to False if your CPU memory is insufficient')
     # schedule
     parser.add_argument("--device",type=str,default='cuda:0')
@@ -36,6 +40,7 @@ def options():
     parser.add_argument("--epoch",type=int,default=30)
     parser.add_argument("--log_dir",default='log/')
     parser.add_argument("--checkpoint_dir",type=str,default="checkpoint/")
+    parser.add_argument("--save_last_freq",type=int,default=1,help='save the last checkpoint every N epochs')
     parser.add_argument("--name",type=str,default='cam2_oneter_11to17')
     parser.add_argument("--optim",type=str,default='sgd',choices=['sgd','adam'])
     parser.add_argument("--lr0",type=float,default=5e-4)
@@ -43,6 +48,11 @@ def options():
     parser.add_argument("--weight_decay",type=float,default=5e-6)
     parser.add_argument("--lr_exp_decay",type=float,default=0.98)
     parser.add_argument("--clip_grad",type=float,default=2.0)
+    parser.add_argument("--compile",type=str,default='off',choices=['off','default','reduce-overhead','max-autotune'],help='torch.compile mode of CalibNet and se3 exp (PyTorch>=2.0)')
+    parser.add_argument("--channels_last",type=str,default='on',choices=['on','off'],help='NHWC memory format for convolutions')
+    parser.add_argument("--log_freq",type=int,default=50,help='update the training progress bar every N batches')
+    parser.add_argument("--accum_steps",type=int,default=1,help='accumulate gradients of N batches before each optimizer step (BatchNorm statistics still see batch_size samples)')
+    parser.add_argument("--amp_dtype",type=str,default='auto',choices=['auto','off','fp16','bf16'],help='mixed precision training on CUDA, auto: bf16 on Ampere or newer GPUs else fp16')
     # setting
     parser.add_argument("--scale",type=float,default=50.0,help='scale factor of pcd normlization in loss')
     parser.add_argument("--inner_iter",type=int,default=1,help='inner iter of calibnet')
@@ -50,59 +60,97 @@ def options():
     parser.add_argument("--beta",type=float,default=0.3,help='weight of chamfer loss')
     parser.add_argument("--resize_ratio",type=float,nargs=2,default=[1.0,1.0])
     # if CUDA is out of memory, please reduce batch_size, pcd_sample or inner_iter
-    return parser.parse_args()
+    args = parser.parse_args()
+    if args.accum_steps < 1:
+        parser.error('--accum_steps must be >= 1')
+    return args
+
+
+def state_to_cpu(state,buffers:dict,key:str=''):
+    """recursively copy tensors of a (nested) state dict to CPU
+
+    Args:
+        state (dict | list | tuple | torch.Tensor | Any): state_dict or its items
+        buffers (dict): pinned CPU buffers reused among calls (filled in place), keyed by the item path
+        key (str, optional): item path of state, used by buffers. Defaults to ''.
+
+    Returns:
+        same structure as state, whose tensors are CPU copies detached from training
+    """
+    if isinstance(state,torch.Tensor):
+        state = state.detach()
+        if state.device.type == 'cpu':
+            return state.clone()
+        buffer = buffers.get(key)
+        if buffer is None or buffer.shape != state.shape or buffer.dtype != state.dtype:
+            buffer = torch.empty_like(state,device='cpu',pin_memory=True)
+            buffers[key] = buffer
+        return buffer.copy_(state,non_blocking=True)  # async D2H copy into page-locked memory
+    elif isinstance(state,dict):
+        cpu_state = {sub_key:state_to_cpu(value,buffers,'{}/{}'.format(key,sub_key)) for sub_key,value in state.items()}
+    elif isinstance(state,(list,tuple)):
+        cpu_state = type(state)(state_to_cpu(value,buffers,'{}/{}'.format(key,i)) for i,value in enumerate(state))
+    else:
+        return state
+    return cpu_state
+
+
+def save_checkpoint(ckpt:dict,paths:list):
+    """write one checkpoint to several paths (run in a background thread)"""
+    for path in paths:
+        torch.save(ckpt,path)
 
 
 @torch.no_grad()
-def val(args,model:CalibNet,val_loader:DataLoader):
+def val(args,model:CalibNet,val_loader:DataLoader,se3_exp=utils.se3.exp):
     model.eval()
     device = model.device
+    memory_format = torch.channels_last if args.channels_last == 'on' else torch.contiguous_format
     tqdm_console = tqdm(total=len(val_loader),desc='Val')
     photo_loss = loss_utils.Photo_Loss(args.scale)
     chamfer_loss = loss_utils.ChamferDistanceLoss(args.scale,'mean')
     alpha = float(args.alpha)
     beta = float(args.beta)
-    total_dR = 0
-    total_dT = 0
-    total_loss = 0
-    total_se3_loss = 0
+    # running sums of [loss, dR, dT, se3_loss] on device, read back once after the loop
+    total_sum = torch.zeros(4,device=device)
+    N_batch = 0
+    depth_generators = dict()  # DepthImgGenerator cached by (img_shape, InTran)
     with tqdm_console:
         tqdm_console.set_description_str('Val')
-        for batch in val_loader:
-            rgb_img = batch['img'].to(device)
+        for batch_i, batch in enumerate(val_loader,1):
+            rgb_img = batch['img'].to(device,non_blocking=True).contiguous(memory_format=memory_format)
             B = rgb_img.size(0)
-            pcd_range = batch['pcd_range'].to(device)
-            calibed_depth_img = batch['depth_img'].to(device)
-            calibed_pcd = batch['pcd'].to(device)
-            uncalibed_pcd = batch['uncalibed_pcd'].to(device)
-            uncalibed_depth_img = batch['uncalibed_depth_img'].to(device)
-            InTran = batch['InTran'][0].to(device)
-            igt = batch['igt'].to(device)
+            pcd_range = batch['pcd_range'].to(device,non_blocking=True)
+            calibed_depth_img = batch['depth_img'].to(device,non_blocking=True)
+            calibed_pcd = batch['pcd'].to(device,non_blocking=True)
+            uncalibed_pcd = batch['uncalibed_pcd'].to(device,non_blocking=True)
+            uncalibed_depth_img = batch['uncalibed_depth_img'].to(device,non_blocking=True)
+            InTran = batch['InTran'][0]
+            igt = batch['igt'].to(device,non_blocking=True)
             img_shape = rgb_img.shape[-2:]
-            depth_generator = utils.transform.DepthImgGenerator(img_shape,InTran,pcd_range,CONFIG['dataset']['pooling'])
+            gen_key = (tuple(img_shape),tuple(InTran.view(-1).tolist()))  # intrinsics differ among KITTI sequences
+            if gen_key not in depth_generators:
+                depth_generators[gen_key] = utils.transform.DepthImgGenerator(img_shape,InTran,CONFIG['dataset']['pooling'])
+            depth_generator = depth_generators[gen_key]
             # model(rgb_img,uncalibed_depth_img)
-            g0 = torch.eye(4).repeat(B,1,1).to(device)
+            g0 = torch.eye(4,device=device).unsqueeze(0).expand(B,-1,-1).contiguous()
             for _ in range(args.inner_iter):
-                twist_rot, twist_tsl = model(rgb_img,uncalibed_depth_img)
-                extran = utils.se3.exp(torch.cat([twist_rot,twist_tsl],dim=1))
-                uncalibed_depth_img, uncalibed_pcd = depth_generator(extran,uncalibed_pcd)
+                twist = model(rgb_img,uncalibed_depth_img.contiguous(memory_format=memory_format))
+                extran = se3_exp(twist)
+                uncalibed_depth_img, uncalibed_pcd = depth_generator(extran,uncalibed_pcd,pcd_range)
                 g0 = extran.bmm(g0)
             err_g = g0.bmm(igt)
             dR,dT = loss_utils.geodesic_distance(err_g)
-            total_dR += dR.item()
-            total_dT += dT.item()
             se3_loss = torch.linalg.norm(utils.se3.log(err_g),dim=1).mean()/6
-            total_se3_loss += se3_loss.item()
             loss1 = photo_loss(calibed_depth_img,uncalibed_depth_img)
             loss2 = chamfer_loss(calibed_pcd,uncalibed_pcd)
             loss = alpha*loss1 + beta*loss2
-            total_loss += loss.item()
-            tqdm_console.set_postfix_str('dR:{:.4f}, dT:{:.4f},se3_loss:{:.4f}'.format(loss1,loss2,se3_loss))
+            total_sum += torch.stack([loss,dR,dT,se3_loss]).detach()
+            N_batch += 1
+            if batch_i % args.log_freq == 0 or batch_i == len(val_loader):
+                tqdm_console.set_postfix_str('dR:{:.4f}, dT:{:.4f},se3_loss:{:.4f}'.format(dR.item(),dT.item(),se3_loss.item()))
             tqdm_console.update(1)
-    total_dR /= len(val_loader)
-    total_dT /= len(val_loader)
-    total_loss /= len(val_loader)
-    total_se3_loss /= len(val_loader)
+    total_loss, total_dR, total_dT, total_se3_loss = (total_sum/max(N_batch,1)).tolist()
     return total_loss, total_dR, total_dT, total_se3_loss
 
 
@@ -110,11 +158,43 @@ def train(args,chkpt,train_loader:DataLoader,val_loader:DataLoader):
     device = torch.device(args.device)
     model = CalibNet(backbone_pretrained=False,depth_scale=args.scale)
     model.to(device)
+    memory_format = torch.channels_last if args.channels_last == 'on' else torch.contiguous_format
+    model.to(memory_format=memory_format)
+    # input image size is fixed, let cudnn cache the fastest conv algorithm; TF32 for the remaining fp32 matmul/conv
+    torch.backends.cudnn.benchmark = True
+    torch.backends.cuda.matmul.allow_tf32 = True
+    torch.backends.cudnn.allow_tf32 = True
+    if args.compile != 'off':
+        # keep the original 'model' for state_dict/optimizer, so checkpoints carry no '_orig_mod.' prefix
+        calib_model = torch.compile(model,mode=args.compile,fullgraph=False)
+        se3_exp = torch.compile(utils.se3.exp,mode=args.compile)
+    else:
+        calib_model = model
+        se3_exp = utils.se3.exp
+    optim_cls = torch.optim.SGD if args.optim == 'sgd' else torch.optim.Adam
+    # single-kernel parameter update on CUDA (SGD supports fused since PyTorch 2.3, Adam since 2.0)
+    if device.type == 'cuda' and torch.cuda.is_available() and 'fused' in inspect.signature(optim_cls).parameters:
+        optim_kwargs = dict(fused=True)
+    else:
+        optim_kwargs = dict()
     if args.optim == 'sgd':
-        optimizer = torch.optim.SGD(model.parameters(),args.lr0,momentum=args.momentum,weight_decay=args.weight_decay)
+        optimizer = torch.optim.SGD(model.parameters(),args.lr0,momentum=args.momentum,weight_decay=args.weight_decay,**optim_kwargs)
     else:
-        optimizer = torch.optim.Adam(model.parameters(),args.lr0,weight_decay=args.weight_decay)
+        optimizer = torch.optim.Adam(model.parameters(),args.lr0,weight_decay=args.weight_decay,**optim_kwargs)
     scheduler = torch.optim.lr_scheduler.ExponentialLR(optimizer,gamma=args.lr_exp_decay)
+    use_amp = args.amp_dtype != 'off' and device.type == 'cuda' and torch.cuda.is_available()
+    # resolve 'auto' locally (args are saved into checkpoints and may be resumed on other GPUs)
+    # bf16 autocast needs PyTorch>=1.10 and only has tensor cores since Ampere (pre-Ampere GPUs emulate it)
+    bf16_available = use_amp and hasattr(torch,'autocast') and torch.cuda.get_device_capability(device)[0] >= 8
+    if args.amp_dtype == 'bf16' and use_amp and not bf16_available:
+        print_warning('bf16 autocast is unavailable on this GPU/PyTorch, use fp16 instead')
+    amp_dtype = torch.bfloat16 if args.amp_dtype in ['auto','bf16'] and bf16_available else torch.float16
+    if hasattr(torch,'autocast'):
+        autocast = lambda: torch.autocast(device_type='cuda',dtype=amp_dtype,enabled=use_amp)
+    else:  # PyTorch < 1.10, fp16 only
+        autocast = lambda: torch.cuda.amp.autocast(enabled=use_amp)
+    # bf16 keeps the fp32 exponent range, loss scaling is only needed for fp16
+    scaler = torch.cuda.amp.GradScaler(enabled=use_amp and amp_dtype is torch.float16)
     if args.pretrained:
         if os.path.exists(args.pretrained) and os.path.isfile(args.pretrained):
             model.load_state_dict(torch.load(args.pretrained)['model'])
@@ -125,6 +205,8 @@ def train(args,chkpt,train_loader:DataLoader,val_loader:DataLoader):
         model.load_state_dict(chkpt['model'])
         optimizer.load_state_dict(chkpt['optimizer'])
         scheduler.load_state_dict(chkpt['scheduler'])
+        if 'scaler' in chkpt:
+            scaler.load_state_dict(chkpt['scaler'])
         start_epoch = chkpt['epoch'] + 1
         min_loss = chkpt['min_loss']
         log_mode = 'a'
@@ -147,80 +229,109 @@ def train(args,chkpt,train_loader:DataLoader,val_loader:DataLoader):
     chamfer_loss = loss_utils.ChamferDistanceLoss(args.scale,'mean')
     alpha = float(args.alpha)
     beta = float(args.beta)
+    depth_generators = dict()  # DepthImgGenerator cached by (img_shape, InTran)
+    save_thread = None
+    pinned_buffers = dict()  # CPU mirror of model/optimizer states for checkpoints
     for epoch in range(start_epoch,args.epoch):
         model.train()
         tqdm_console = tqdm(total=len(train_loader),desc='Train')
-        total_photo_loss = 0
-        total_chamfer_loss = 0
+        total_photo_loss = torch.zeros((),device=device)
+        total_chamfer_loss = torch.zeros((),device=device)
         with tqdm_console:
             tqdm_console.set_description_str('Epoch: {:03d}|{:03d}'.format(epoch+1,args.epoch))
-            for batch in train_loader:
-                optimizer.zero_grad()
-                rgb_img = batch['img'].to(device)
+            optimizer.zero_grad(set_to_none=True)
+            for batch_i, batch in enumerate(train_loader,1):
+                rgb_img = batch['img'].to(device,non_blocking=True).contiguous(memory_format=memory_format)
                 B = rgb_img.size(0)
-                pcd_range = batch['pcd_range'].to(device)
-                calibed_depth_img = batch['depth_img'].to(device)
-                calibed_pcd = batch['pcd'].to(device)
-                uncalibed_pcd = batch['uncalibed_pcd'].to(device)
-                uncalibed_depth_img = batch['uncalibed_depth_img'].to(device)
-                InTran = batch['InTran'][0].to(device)
-                igt = batch['igt'].to(device)
+                pcd_range = batch['pcd_range'].to(device,non_blocking=True)
+                calibed_depth_img = batch['depth_img'].to(device,non_blocking=True)
+                calibed_pcd = batch['pcd'].to(device,non_blocking=True)
+                uncalibed_pcd = batch['uncalibed_pcd'].to(device,non_blocking=True)
+                uncalibed_depth_img = batch['uncalibed_depth_img'].to(device,non_blocking=True)
+                InTran = batch['InTran'][0]
+                igt = batch['igt'].to(device,non_blocking=True)
                 img_shape = rgb_img.shape[-2:]
-                depth_generator = utils.transform.DepthImgGenerator(img_shape,InTran,pcd_range,CONFIG['dataset']['pooling'])
+                gen_key = (tuple(img_shape),tuple(InTran.view(-1).tolist()))  # intrinsics differ among KITTI sequences
+                if gen_key not in depth_generators:
+                    depth_generators[gen_key] = utils.transform.DepthImgGenerator(img_shape,InTran,CONFIG['dataset']['pooling'])
+                depth_generator = depth_generators[gen_key]
                 # model(rgb_img,uncalibed_depth_img)
-                Tcl = torch.eye(4).repeat(B,1,1).to(device)
+                Tcl = torch.eye(4,device=device).unsqueeze(0).expand(B,-1,-1).contiguous()
                 # model.eval()
                 for _ in range(args.inner_iter):
-                    twist_rot, twist_tsl = model(rgb_img,uncalibed_depth_img)
-                    iter_Tcl = utils.se3.exp(torch.cat([twist_rot,twist_tsl],dim=1))
-                    uncalibed_depth_img, uncalibed_pcd = depth_generator(iter_Tcl, uncalibed_pcd)
-                    Tcl = Tcl.bmm(iter_Tcl)  # right product (chronologically left product)
-                dR,dT = loss_utils.geodesic_distance(Tcl.bmm(igt))
+                    with autocast():
+                        twist = calib_model(rgb_img,uncalibed_depth_img.contiguous(memory_format=memory_format))
+                    # se3 exp and depth projection stay in fp32 (series expansion needs fp32 range)
+                    iter_Tcl = se3_exp(twist.float())
+                    uncalibed_depth_img, uncalibed_pcd = depth_generator(iter_Tcl,uncalibed_pcd,pcd_range)
+                    Tcl = iter_Tcl.bmm(Tcl)  # left product: pcd is transformed by iter_Tcl after Tcl
                 # model.train()
                 loss1 = photo_loss(calibed_depth_img,uncalibed_depth_img)
                 loss2 = chamfer_loss(calibed_pcd,uncalibed_pcd)
-                loss = alpha*loss1 + beta*loss2
-                loss.backward()
-                nn.utils.clip_grad_value_(model.parameters(),args.clip_grad)
-                optimizer.step()
-                tqdm_console.set_postfix_str("p:{:.3f}, c:{:.3f}, dR:{:.3f}, dT:{:.3f}".format(loss1.item(),loss2.item(),dR.item(),dT.item()))
+                # the last group of an epoch may have fewer than accum_steps batches
+                accum_size = min(args.accum_steps,len(train_loader)-(batch_i-1)//args.accum_steps*args.accum_steps)
+                loss = (alpha*loss1 + beta*loss2)/accum_size
+                scaler.scale(loss).backward()
+                if batch_i % args.accum_steps == 0 or batch_i == len(train_loader):
+                    scaler.unscale_(optimizer)  # clip the real gradients, not the scaled ones
+                    nn.utils.clip_grad_value_(model.parameters(),args.clip_grad)
+                    scaler.step(optimizer)
+                    scaler.update()
+                    optimizer.zero_grad(set_to_none=True)
+                # accumulate on device, .item() would sync with the GPU on every batch
+                total_photo_loss += loss1.detach()
+                total_chamfer_loss += loss2.detach()
+                if batch_i % args.log_freq == 0 or batch_i == len(train_loader):
+                    dR,dT = loss_utils.geodesic_distance(Tcl.detach().bmm(igt))
+                    tqdm_console.set_postfix_str("p:{:.3f}, c:{:.3f}, dR:{:.3f}, dT:{:.3f}".format(loss1.item(),loss2.item(),dR.item(),dT.item()))
                 tqdm_console.update()
-                total_photo_loss += loss1.item()
-                total_chamfer_loss += loss2.item()
         N_loader = len(train_loader)
-        total_photo_loss /= N_loader
-        total_chamfer_loss /= N_loader
+        total_photo_loss = total_photo_loss.item()/N_loader
+        total_chamfer_loss = total_chamfer_loss.item()/N_loader
         total_loss = alpha*total_photo_loss + beta*total_chamfer_loss
         tqdm_console.set_postfix_str("loss: {:.3f}, photo: {:.3f}, chamfer: {:.3f}".format(total_loss,total_photo_loss,total_chamfer_loss))
         tqdm_console.update()
         tqdm_console.close()
         logger.info('Epoch {:03d}|{:03d}, train loss:{:.4f}'.format(epoch+1,args.epoch,total_loss))
         scheduler.step()
-        val_loss, loss_dR, loss_dT, loss_se3 = val(args,model,val_loader)  # float 
-        if loss_se3 < min_loss:
+        if save_thread is not None:
+            save_thread.join()  # previous checkpoint must be on disk before its pinned buffers are overwritten
+        save_last = (epoch+1) % args.save_last_freq == 0 or epoch+1 == args.epoch
+        if save_last:
+            # issue D2H copies of model and optimizer (momentum) states now, they overlap with validation
+            train_state = state_to_cpu(dict(model=model.state_dict(),optimizer=optimizer.state_dict()),pinned_buffers)
+        val_loss, loss_dR, loss_dT, loss_se3 = val(args,calib_model,val_loader,se3_exp)  # float 
+        save_best = loss_se3 < min_loss
+        if save_best:
             min_loss = loss_se3
-            torch.save(dict(
-                model=model.state_dict(),
-                optimizer=optimizer.state_dict(),
+            if not save_last:  # no last checkpoint due in this epoch, copy only now that it is needed
+                train_state = state_to_cpu(dict(model=model.state_dict(),optimizer=optimizer.state_dict()),pinned_buffers)
+        if save_best or save_last:
+            if torch.cuda.is_available():
+                torch.cuda.synchronize()  # wait for the non_blocking D2H copies
+            ckpt = dict(
+                model=train_state['model'],
+                optimizer=train_state['optimizer'],
                 scheduler=scheduler.state_dict(),
+                scaler=scaler.state_dict(),
                 min_loss=min_loss,
                 epoch=epoch,
-                args=args.__dict__,
+                args=dict(args.__dict__),
                 config=CONFIG
-            ),os.path.join(args.checkpoint_dir,'{name}_best.pth'.format(name=args.name)))
-            logger.debug('Best model saved (Epoch {:d})'.format(epoch+1))
-            print_highlight('Best Model (Epoch %d)'%(epoch+1))
-        torch.save(dict(
-                model=model.state_dict(),
-                optimizer=optimizer.state_dict(),
-                scheduler=scheduler.state_dict(),
-                min_loss=min_loss,
-                epoch=epoch,
-                args=args.__dict__,
-                config=CONFIG
-            ),os.path.join(args.checkpoint_dir,'{name}_last.pth'.format(name=args.name)))
+            )
+            ckpt_paths = []
+            if save_best:
+                ckpt_paths.append(os.path.join(args.checkpoint_dir,'{name}_best.pth'.format(name=args.name)))
+            if save_last:
+                ckpt_paths.append(os.path.join(args.checkpoint_dir,'{name}_last.pth'.format(name=args.name)))
+            save_thread = threading.Thread(target=save_checkpoint,args=(ckpt,ckpt_paths))
+            save_thread.start()
+            if save_best:
+                logger.debug('Best model saved (Epoch {:d})'.format(epoch+1))
+                print_highlight('Best Model (Epoch %d)'%(epoch+1))
         logger.info('Evaluate loss_dR:{:.6f}, loss_dT:{:.6f}, se3_loss:{:.6f}'.format(loss_dR,loss_dT,loss_se3))
-            
+    if save_thread is not None:
+        save_thread.join()
             
             
 
@@ -245,14 +356,14 @@ if __name__ == "__main__":
     train_dataset = BaseKITTIDataset(args.dataset_path,args.batch_size,train_split,CONFIG['dataset']['cam_id'],
                                      skip_frame=args.skip_frame,voxel_size=CONFIG['dataset']['voxel_size'],
                                      pcd_sample_num=args.pcd_sample,resize_ratio=args.resize_ratio,
-                                     extend_ratio=CONFIG['dataset']['extend_ratio'])
+                                     extend_ratio=CONFIG['dataset']['extend_ratio'],cache_dir=args.pcd_cache_dir)
     train_dataset = KITTI_perturb(train_dataset,args.max_deg,args.max_tran,args.mag_randomly,
                                   pooling_size=CONFIG['dataset']['pooling'])
     
     val_dataset = BaseKITTIDataset(args.dataset_path,args.batch_size,val_split,CONFIG['dataset']['cam_id'],
                                      skip_frame=args.skip_frame,voxel_size=CONFIG['dataset']['voxel_size'],
                                      pcd_sample_num=args.pcd_sample,resize_ratio=args.resize_ratio,
-                                     extend_ratio=CONFIG['dataset']['extend_ratio'])
+                                     extend_ratio=CONFIG['dataset']['extend_ratio'],cache_dir=args.pcd_cache_dir)
     val_perturb_file = os.path.join(args.checkpoint_dir,"val_seq.csv")
     val_length = len(val_dataset)
     if not os.path.exists(val_perturb_file):
@@ -279,8 +390,12 @@ if __name__ == "__main__":
     train_drop_last = True if len(train_dataset) % args.batch_size == 1 else False  
     val_drop_last = True if len(val_dataset) % args.batch_size == 1 else False
     # dataloader
-    train_dataloader = DataLoader(train_dataset,args.batch_size,shuffle=False,num_workers=args.num_workers,pin_memory=args.pin_memory,drop_last=train_drop_last)
-    val_dataloder = DataLoader(val_dataset,args.batch_size,shuffle=False,num_workers=args.num_workers+8,pin_memory=args.pin_memory,drop_last=val_drop_last)
+    use_pin = args.pin_memory and torch.cuda.is_available()  # page-locked memory is useless without CUDA
+    # keep workers alive between epochs (prefetch_factor is only accepted with num_workers > 0)
+    train_worker_kwargs = dict(persistent_workers=True,prefetch_factor=args.prefetch_factor) if args.num_workers > 0 else dict()
+    train_dataloader = DataLoader(train_dataset,args.batch_size,shuffle=False,num_workers=args.num_workers,pin_memory=use_pin,drop_last=train_drop_last,**train_worker_kwargs)
+    val_dataloder = DataLoader(val_dataset,args.batch_size,shuffle=False,num_workers=args.num_workers+8,pin_memory=use_pin,drop_last=val_drop_last,
+                               persistent_workers=True,prefetch_factor=args.prefetch_factor)
     
         
     train(args,chkpt,train_dataloader,val_dataloder)
\ No newline at end of file
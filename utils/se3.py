@@ -54,21 +54,23 @@ def exp(x:torch.Tensor):
     t = w.norm(p=2, dim=1).view(-1, 1, 1)
     W = so3.mat(w)
     S = W.bmm(W)
-    I = torch.eye(3).to(w)
+    I = torch.eye(3, dtype=w.dtype, device=w.device)
 
     # Rodrigues' rotation formula.
     #R = cos(t)*eye(3) + sinc1(t)*W + sinc2(t)*(w*w');
     #  = eye(3) + sinc1(t)*W + sinc2(t)*S
-    R = I + sinc1(t)*W + sinc2(t)*S
+    s2 = sinc2(t)
+    R = I + sinc1(t)*W + s2*S
 
     #V = sinc1(t)*eye(3) + sinc2(t)*W + sinc3(t)*(w*w')
     #  = eye(3) + sinc2(t)*W + sinc3(t)*S
-    V = I + sinc2(t)*W + sinc3(t)*S
+    V = I + s2*W + sinc3(t)*S
 
     p = V.bmm(v.contiguous().view(-1, 3, 1))
 
-    z = torch.Tensor([0, 0, 0, 1]).view(1, 1, 4).repeat(x_.size(0), 1, 1).to(x)
     Rp = torch.cat((R, p), dim=2)
+    z = torch.zeros_like(Rp[:, 0:1, :])  # [0, 0, 0, 1] built on the device of x
+    z[:, :, 3] = 1
     g = torch.cat((Rp, z), dim=1)
 
     return g.view(*(x.size()[0:-1]), 4, 4)
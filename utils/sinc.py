@@ -1,20 +1,18 @@
-""" sinc(t) := sin(t) / t """
+""" sinc(t) := sin(t) / t
+
+sinc1, sinc2 and sinc3 lie on the se3/so3 exp path and are evaluated branch-free
+with torch.where, boolean-mask indexing would sync with the host on every call.
+"""
 import torch
 from torch import sin, cos
 
 def sinc1(t):
     """ sinc1: t -> sin(t)/t """
     e = 0.01
-    r = torch.zeros_like(t)
-    a = torch.abs(t)
-
-    s = a < e
-    c = (s == 0)
-    t2 = t[s] ** 2
-    r[s] = 1 - t2/6*(1 - t2/20*(1 - t2/42))  # Taylor series O(t^8)
-    r[c] = sin(t[c]) / t[c]
-
-    return r
+    s = torch.abs(t) < e
+    t2 = t ** 2
+    t_ = torch.where(s, torch.ones_like(t), t)  # keep the unused branch (and its grad) finite near 0
+    return torch.where(s, 1 - t2/6*(1 - t2/20*(1 - t2/42)), sin(t_) / t_)  # Taylor series O(t^8)
 
 def sinc1_dt(t):
     """ d/dt(sinc1) """
@@ -91,16 +89,10 @@ def rsinc1_dt_csc(t):
 def sinc2(t):
     """ sinc2: t -> (1 - cos(t)) / (t**2) """
     e = 0.01
-    r = torch.zeros_like(t)
-    a = torch.abs(t)
-
-    s = a < e
-    c = (s == 0)
+    s = torch.abs(t) < e
     t2 = t ** 2
-    r[s] = 1/2*(1-t2[s]/12*(1-t2[s]/30*(1-t2[s]/56)))  # Taylor series O(t^8)
-    r[c] = (1-cos(t[c]))/t2[c]
-
-    return r
+    t_ = torch.where(s, torch.ones_like(t), t)
+    return torch.where(s, 1/2*(1-t2/12*(1-t2/30*(1-t2/56))), (1-cos(t_))/t_**2)  # Taylor series O(t^8)
 
 def sinc2_dt(t):
     """ d/dt(sinc2) """
@@ -120,16 +112,10 @@ def sinc2_dt(t):
 def sinc3(t):
     """ sinc3: t -> (t - sin(t)) / (t**3) """
     e = 0.01
-    r = torch.zeros_like(t)
-    a = torch.abs(t)
-
-    s = a < e
-    c = (s == 0)
-    t2 = t[s] ** 2
-    r[s] = 1/6*(1-t2/20*(1-t2/42*(1-t2/72)))  # Taylor series O(t^8)
-    r[c] = (t[c]-sin(t[c]))/(t[c]**3)
-
-    return r
+    s = torch.abs(t) < e
+    t2 = t ** 2
+    t_ = torch.where(s, torch.ones_like(t), t)
+    return torch.where(s, 1/6*(1-t2/20*(1-t2/42*(1-t2/72))), (t_-sin(t_))/(t_**3))  # Taylor series O(t^8)
 
 def sinc3_dt(t):
     """ d/dt(sinc3) """
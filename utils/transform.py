@@ -108,21 +108,21 @@ class UniformTransformSE3:
         return self.transform(tensor)
 
 class DepthImgGenerator:
-    def __init__(self,img_shape:Iterable,InTran:torch.Tensor,pcd_range:torch.Tensor,pooling_size=5):
+    def __init__(self,img_shape:Iterable,InTran:torch.Tensor,pooling_size=5):
         assert (pooling_size-1) % 2 == 0, 'pooling size must be odd to keep image size constant'
         self.pooling = torch.nn.MaxPool2d(kernel_size=pooling_size,stride=1,padding=(pooling_size-1)//2)
         # InTran (3,4) or (4,4)
         self.img_shape = img_shape
         self.InTran = torch.eye(3)[None,...]
         self.InTran[0,:InTran.size(0),:InTran.size(1)] = InTran  # [1,3,3]
-        self.pcd_range = pcd_range  # (B,N)
 
-    def transform(self,ExTran:torch.Tensor,pcd:torch.Tensor)->tuple:
+    def transform(self,ExTran:torch.Tensor,pcd:torch.Tensor,pcd_range:torch.Tensor)->tuple:
         """transform pcd and project it to img
 
         Args:
             ExTran (torch.Tensor): B,4,4
             pcd (torch.Tensor): B,3,N
+            pcd_range (torch.Tensor): B,N
 
         Returns:
             tuple: depth_img (B,H,W), transformed_pcd (B,3,N)
@@ -131,32 +131,33 @@ class DepthImgGenerator:
         B = ExTran.size(0)
         self.InTran = self.InTran.to(pcd.device)
         pcd = se3.transform(ExTran,pcd)  # [B,4,4] x [B,3,N] -> [B,3,N]
-        proj_pcd = torch.bmm(self.InTran.repeat(B,1,1),pcd) # [B,3,3] x [B,3,N] -> [B,3,N]
+        proj_pcd = torch.matmul(self.InTran,pcd) # [1,3,3] x [B,3,N] -> [B,3,N]
         proj_x = (proj_pcd[:,0,:]/proj_pcd[:,2,:]).type(torch.long)
         proj_y = (proj_pcd[:,1,:]/proj_pcd[:,2,:]).type(torch.long)
         rev = ((proj_x>=0)*(proj_x<W)*(proj_y>=0)*(proj_y<H)*(proj_pcd[:,2,:]>0)).type(torch.bool)  # [B,N]
-        batch_depth_img = torch.zeros(B,H,W,dtype=torch.float32).to(pcd.device)  # [B,H,W]
-        # size of rev_i is not constant so that a batch-formed operdation cannot be applied
-        for bi in range(B):
-            rev_i = rev[bi,:]  # (N,)
-            proj_xrev = proj_x[bi,rev_i]
-            proj_yrev = proj_y[bi,rev_i]
-            batch_depth_img[bi*torch.ones_like(proj_xrev),proj_yrev,proj_xrev] = self.pcd_range[bi,rev_i]
+        # scatter the whole batch at once with static shapes (no host sync, capturable by CUDA graphs):
+        # points outside the image are written to an extra dummy pixel which is dropped afterwards
+        batch_index = torch.arange(B,device=pcd.device).view(B,1)  # [B,1]
+        flat_index = ((batch_index*H + proj_y)*W + proj_x).masked_fill(~rev,B*H*W)  # [B,N]
+        batch_depth_img = torch.zeros(B*H*W+1,dtype=torch.float32,device=pcd.device)
+        batch_depth_img.index_put_((flat_index.view(-1),),pcd_range.reshape(-1).type(torch.float32))
+        batch_depth_img = batch_depth_img[:-1].view(B,H,W)  # [B,H,W]
         return batch_depth_img.unsqueeze(1), pcd   # (B,1,H,W), (B,3,N)
     
-    def __call__(self,ExTran:torch.Tensor,pcd:torch.Tensor):
+    def __call__(self,ExTran:torch.Tensor,pcd:torch.Tensor,pcd_range:torch.Tensor):
         """transform pcd and project it to img
 
         Args:
             ExTran (torch.Tensor): B,4,4
             pcd (torch.Tensor): B,3,N
+            pcd_range (torch.Tensor): B,N
 
         Returns:
             tuple: depth_img (B,H,W), transformed_pcd (B,3,N)
         """
         assert len(ExTran.size()) == 3, 'ExTran size must be (B,4,4)'
         assert len(pcd.size()) == 3, 'pcd size must be (B,3,N)'
-        return self.transform(ExTran,pcd)
+        return self.transform(ExTran,pcd,pcd_range)
     
 def pcd_projection(img_shape:tuple,intran:np.ndarray,pcd:np.ndarray,range:np.ndarray):
     """project pcd into depth img